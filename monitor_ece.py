@@ -1,9 +1,31 @@
-import requests
+import atexit
 import json
+import logging
+import requests
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from operator import itemgetter
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from requests.auth import AuthBase
 from urllib3.exceptions import InsecureRequestWarning
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # Falls back to the slower standard library json module
+    orjson = None
+try:
+    import zstandard
+except ImportError:  # Only needed for compressed '.zst' output files
+    zstandard = None
+
+# orjson >= 3.9 can embed already-encoded JSON in its output without parsing it
+JSON_FRAGMENT = getattr(orjson, "Fragment", None)
 
 # Suppress SSL warnings for insecure requests (use with caution)
 
@@ -14,36 +36,238 @@ load_dotenv()
 
 # --- Configuration from .env ---
 HOST = os.getenv("HOST")
+API_KEY = os.getenv("API_KEY")
 USERNAME = os.getenv("USERNAME")
 PASSWORD = os.getenv("PASSWORD")
+# A name ending in ".zst" writes a zstd-compressed file
 OUTPUT_FILE = os.getenv("OUTPUT_FILE", "metrics.json")
+# "json" writes one document at the end of the run, "ndjson" streams one line
+# per deployment as soon as it has been fetched
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "json").lower()
 VERIFY_SSL = os.getenv("VERIFY_SSL", "False") == "True"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# _cluster/stats is only needed for the raw JSON dump, not for the summary
+FETCH_STATS = os.getenv("FETCH_STATS", "False") == "True"
+# Elasticsearch filter_path for _cluster/stats, e.g. "status,indices.count,nodes.count",
+# so large clusters return only the fields you need; empty keeps the full response
+STATS_FILTER_PATH = os.getenv("STATS_FILTER_PATH", "")
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "16"))
+# How long platform and allocator data is reused when running in a loop;
+# allocator capacity moves faster than the platform version, so it expires sooner
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "300"))
+ALLOCATORS_CACHE_TTL_SECONDS = float(os.getenv("ALLOCATORS_CACHE_TTL_SECONDS", "60"))
+# Ignore every cached response and fetch everything fresh
+NO_CACHE = os.getenv("NO_CACHE", "False") == "True"
+# Cluster health and stats from the previous run; deployments whose configuration
+# has not changed since reuse them instead of querying Elasticsearch. Off when ""
+STATE_FILE = os.getenv("STATE_FILE", "")
+# Health can change without a configuration change, so snapshots older than this
+# are fetched again even for unchanged deployments
+STATE_MAX_AGE_SECONDS = float(os.getenv("STATE_MAX_AGE_SECONDS", "900"))
+# ETags and responses from the previous run; set to "" to disable
+ENDPOINT_CACHE_FILE = os.getenv("ENDPOINT_CACHE_FILE", ".endpoint_cache.json")
+
+log = logging.getLogger("ece")
+
+# --- API paths, appended to the ECE host or an Elasticsearch endpoint ---
+PLATFORM_PATH = "/api/v1/platform"
+ALLOCATORS_PATH = "/api/v1/platform/infrastructure/allocators"
+DEPLOYMENT_LIST_PATH = "/api/v1/deployments?show_metadata=true&show_plans=true"
+DEPLOYMENT_URL_TMPL = "/api/v1/deployments/%s?show_metadata=true"
+HEALTH_SUFFIX = "/_cluster/health"
+STATS_SUFFIX = "/_cluster/stats"
+
+# (connect, read) timeout in seconds for every API call
+REQUEST_TIMEOUT = (5, 30)
+
+# --- Shared HTTP session ---
+# A single session keeps TCP/TLS connections alive between calls to the same
+# host instead of opening a new one for every request. The adapter keeps one
+# connection pool per host: the ECE API plus the Elasticsearch endpoint each
+# worker is talking to, so those pools are not evicted between deployments.
+POOL_CONNECTIONS = MAX_WORKERS + 1
+# Every worker may hold a connection to the ECE host at the same time; a smaller
+# pool would close the surplus connections instead of keeping them alive
+POOL_MAXSIZE = max(32, MAX_WORKERS)
+# Gateway errors from the ECE proxy are usually transient, so idempotent GETs
+# are retried with a short backoff. The last response is still returned rather
+# than raised so make_api_request reports it as an ordinary HTTPError.
+RETRY = Retry(
+    total=3,
+    backoff_factor=0.3,
+    status_forcelist=[502, 503, 504],
+    raise_on_status=False,
+)
+SESSION = requests.Session()
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=RETRY
+    ),
+)
+SESSION.mount(
+    "http://",
+    HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=RETRY
+    ),
+)
+# Ask for compressed responses; large JSON bodies such as _cluster/stats shrink
+# considerably and requests decompresses them transparently. urllib3 lists every
+# encoding it can decode here, including br when brotli is installed.
+SESSION.headers["Accept-Encoding"] = ACCEPT_ENCODING
+atexit.register(SESSION.close)
+
+# In-process cache for slow-changing endpoints: url -> (fetched_at, response)
+_RESPONSE_CACHE = {}
+
+
+class ApiKeyAuth(AuthBase):
+    """
+    Authenticates requests with an Elastic API key.
+
+    Args:
+        api_key (str): The encoded API key.
+    """
 
+    def __init__(self, api_key):
+        self.header = f"ApiKey {api_key}"
 
-def make_api_request(url, username, password, verify_ssl=False, stream=False):
+    def __call__(self, request):
+        request.headers["Authorization"] = self.header
+        return request
+
+
+def json_loads(data):
     """
-    Makes an API GET request and returns the JSON response.
+    Parses a JSON document with orjson when it is installed.
+
+    Args:
+        data (bytes): The raw JSON document.
+
+    Returns:
+        The parsed document.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(data, indent=False):
+    """
+    Serializes data to UTF-8 JSON bytes with orjson when it is installed.
+
+    Args:
+        data: The data to serialize.
+        indent (bool): Whether to pretty-print with two-space indentation (default: False).
+
+    Returns:
+        bytes: The serialized document.
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, option=option)
+    if indent:
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+    else:
+        text = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return text.encode("utf-8")
+
+
+def stale_copy(body):
+    """
+    Marks a cached response body that is served because a refresh failed.
+
+    Args:
+        body (dict): The cached response body.
+
+    Returns:
+        dict: A copy of the body with 'stale' set to True.
+    """
+    return {**body, "stale": True}
+
+
+def make_api_request(url, stream=False, cache=None, raw=False, allow_stale=False):
+    """
+    Makes an API GET request with the shared session and returns the JSON response.
 
     Args:
         url (str): The URL for the API endpoint.
-        username (str): The username for authentication.
-        password (str): The password for authentication.
-        verify_ssl (bool): Whether to verify SSL certificates (default: False).
         stream (bool): Whether to stream the response content (default: False).
+        cache (dict): Previous responses keyed by URL, each with its 'body' and the
+            'etag' and/or 'last_modified' validators. When given, the request is
+            conditional: a 304 returns the cached body and a 200 carrying an ETag or
+            Last-Modified header replaces the entry (default: None).
+        raw (bool): Whether to return a JSON body unparsed, for responses that are
+            only written to the output file. Needs orjson 3.9 or later, otherwise the
+            body is parsed as usual (default: False).
+        allow_stale (bool): Whether a 5xx response or a failed connection may return
+            the cached body, marked with 'stale', instead of an error. Leave this off
+            for live status such as cluster health, where the last known state would
+            hide an outage (default: False).
 
     Returns:
-        dict: The JSON response from the API, or an error dictionary if the request fails.
+        dict: The JSON response from the API (an orjson.Fragment when returned raw),
+              or an error dictionary if the request fails.
     """
+    cache_entry = cache.get(url) if cache is not None else None
+    # Only a dict body can carry the 'stale' marker
+    stale_ok = (
+        allow_stale
+        and cache_entry is not None
+        and isinstance(cache_entry.get("body"), dict)
+    )
+    headers = {}
+    if cache_entry:
+        if "etag" in cache_entry:
+            headers["If-None-Match"] = cache_entry["etag"]
+        if "last_modified" in cache_entry:
+            headers["If-Modified-Since"] = cache_entry["last_modified"]
     try:
-        response = requests.get(
-            url, auth=(username, password), verify=verify_ssl, stream=stream
+        # verify is still passed explicitly: requests lets REQUESTS_CA_BUNDLE
+        # override a session-level verify=False
+        response = SESSION.get(
+            url,
+            headers=headers,
+            verify=SESSION.verify,
+            stream=stream,
+            timeout=REQUEST_TIMEOUT,
         )
         response.raise_for_status()
-        return response.json()
+        if response.status_code == 304:
+            return cache_entry["body"]
+        body = response.content
+        # A pretty-printed body would span several NDJSON lines, so parse those
+        if (
+            raw
+            and JSON_FRAGMENT is not None
+            and response.headers.get("Content-Type", "").startswith("application/json")
+            and b"\n" not in body
+        ):
+            data = JSON_FRAGMENT(body)
+        else:
+            data = json_loads(body)
+        if cache is not None:
+            entry = {"body": data}
+            if "ETag" in response.headers:
+                entry["etag"] = response.headers["ETag"]
+            if "Last-Modified" in response.headers:
+                entry["last_modified"] = response.headers["Last-Modified"]
+            if len(entry) > 1:
+                cache[url] = entry
+        return data
     except requests.exceptions.HTTPError as e:
-        print(
-            f"ERROR: HTTP error for {url}: {e.response.status_code} - {e.response.text}",
-            file=sys.stderr,
+        # Server errors are usually transient, so report the last known state.
+        # Client errors such as 401 or 404 are real answers and are not masked.
+        if e.response.status_code >= 500 and stale_ok:
+            log.warning(
+                f"WARNING: HTTP error for {url}: {e.response.status_code}, "
+                "using cached response"
+            )
+            return stale_copy(cache_entry["body"])
+        log.error(
+            f"ERROR: HTTP error for {url}: {e.response.status_code} - {e.response.text}"
         )
         return {
             "error": "HTTPError",
@@ -51,122 +275,239 @@ def make_api_request(url, username, password, verify_ssl=False, stream=False):
             "details": e.response.text,
         }
     except requests.exceptions.RequestException as e:
-        print(f"ERROR: Request failed for {url}: {e}", file=sys.stderr)
+        if stale_ok:
+            # Better to report the last known state than nothing at all
+            log.warning(
+                f"WARNING: Request failed for {url}, using cached response: {e}"
+            )
+            return stale_copy(cache_entry["body"])
+        log.error(f"ERROR: Request failed for {url}: {e}")
         return {"error": "RequestException", "details": str(e)}
+    except json.JSONDecodeError as e:
+        log.error(f"ERROR: Invalid JSON response from {url}: {e}")
+        return {"error": "JSONDecodeError", "details": str(e)}
+
+
+def cached_api_request(url, ttl=CACHE_TTL_SECONDS):
+    """
+    Makes an API GET request, reusing a previous response for the same URL while it
+    is younger than the TTL. Error responses are never cached; if a refresh fails, the
+    expired response is returned instead, marked with 'stale'.
 
+    Args:
+        url (str): The URL for the API endpoint.
+        ttl (float): How long a response is reused, in seconds (default: CACHE_TTL_SECONDS).
 
-def fetch_platform_and_allocators(host, username, password, verify_ssl):
+    Returns:
+        dict: The JSON response from the API, or an error dictionary if the request fails.
+    """
+    cached = _RESPONSE_CACHE.get(url)
+    if cached and not NO_CACHE and time.monotonic() - cached[0] < ttl:
+        return cached[1]
+    result = make_api_request(url)
+    if not (isinstance(result, dict) and "error" in result):
+        _RESPONSE_CACHE[url] = (time.monotonic(), result)
+    elif cached and isinstance(cached[1], dict):
+        log.warning(f"WARNING: Using stale cached response for {url}")
+        return stale_copy(cached[1])
+    return result
+
+
+def fetch_platform_and_allocators(host, executor):
     """
     Fetches platform information and allocator details.
 
     Args:
         host (str): The base URL of the environment.
-        username (str): The username for authentication.
-        password (str): The password for authentication.
-        verify_ssl (bool): Whether to verify SSL certificates.
+        executor (Executor): Executor used to fetch both endpoints concurrently.
 
     Returns:
         dict: A dictionary containing 'platform_info' and 'allocators' data.
     """
-    print("\n--- Fetching Platform and Allocator Information ---")
-    metrics = {}
-    metrics["platform_info"] = make_api_request(
-        f"{host}/api/v1/platform", username, password, verify_ssl
-    )
-    metrics["allocators"] = make_api_request(
-        f"{host}/api/v1/platform/infrastructure/allocators",
-        username,
-        password,
-        verify_ssl,
+    log.info("\n--- Fetching Platform and Allocator Information ---")
+    # Platform version and allocator inventory change rarely, so both are cached
+    platform_future = executor.submit(cached_api_request, host + PLATFORM_PATH)
+    allocators = cached_api_request(
+        host + ALLOCATORS_PATH, ttl=ALLOCATORS_CACHE_TTL_SECONDS
     )
+    metrics = {}
+    metrics["platform_info"] = platform_future.result()
+    metrics["allocators"] = allocators
     return metrics
 
 
-def fetch_deployment_list(host, username, password, verify_ssl):
+def fetch_deployment_list(host):
     """
     Fetches the list of all deployments.
 
     Args:
         host (str): The base URL of the environment.
-        username (str): The username for authentication.
-        password (str): The password for authentication.
-        verify_ssl (bool): Whether to verify SSL certificates.
 
     Returns:
-        list: A list of deployment dictionaries.
+        list: A list of deployment dictionaries sorted by name. When the API honours
+              the metadata flags, each one already includes the full 'resources' block.
     """
-    print("\n--- Fetching Deployment List ---")
-    deployment_list_response = make_api_request(
-        f"{host}/api/v1/deployments", username, password, verify_ssl
-    )
-    return deployment_list_response.get("deployments", [])
-
-
-def fetch_deployment_details(host, username, password, verify_ssl, deployment):
+    log.info("\n--- Fetching Deployment List ---")
+    deployment_list_response = make_api_request(host + DEPLOYMENT_LIST_PATH)
+    deployments = deployment_list_response.get("deployments", [])
+    # Fall back to the ID for unnamed deployments, and sort once here so later
+    # stages (including the summary) keep this order without sorting again
+    for deployment in deployments:
+        deployment.setdefault("name", deployment["id"])
+    deployments.sort(key=itemgetter("name"))
+    return deployments
+
+
+def fetch_deployment_details(host, endpoint_cache, state, fetch_stats, deployment):
     """
     Fetches detailed information for a single deployment, including ES cluster health and stats.
 
+    An unexpected error only fails this deployment: it is logged and stored as the
+    deployment's 'elasticsearch_cluster_health', in the same shape as a failed API
+    request, so the summary counts it as an error. Anything fetched before the error
+    is kept.
+
     Args:
         host (str): The base URL of the environment.
-        username (str): The username for authentication.
-        password (str): The password for authentication.
-        verify_ssl (bool): Whether to verify SSL certificates.
+        endpoint_cache (dict): Cached responses keyed by deployment ID, then by URL.
+        state (dict): Health and stats of the previous run keyed by deployment ID,
+            updated in place with this run's.
+        fetch_stats (bool): Whether to also fetch the ES cluster stats.
         deployment (dict): The deployment dictionary containing at least 'id' and 'name'.
 
     Returns:
         dict: The updated deployment dictionary with 'details', 'elasticsearch_cluster_health',
-              and 'elasticsearch_cluster_stats' if available.
+              and 'elasticsearch_cluster_stats' if available and requested.
     """
-    dep_id = deployment["id"]
-    dep_name = deployment.get("name", dep_id)
-    print(f"\nProcessing Deployment: '{dep_name}' (ID: {dep_id})")
-
-    # Get full deployment details to find the ES endpoint
-    details_url = f"{host}/api/v1/deployments/{dep_id}?show_metadata=true"
-    details = make_api_request(details_url, username, password, verify_ssl)
-    deployment["details"] = details
-
-    # Elasticsearch resource and its endpoint
-    es_resource = None
-    if (
-        isinstance(details, dict)
-        and "resources" in details
-        and "elasticsearch" in details["resources"]
-    ):
-        es_resource = next(
-            (
-                r
-                for r in details["resources"]["elasticsearch"]
-                if "info" in r and "cluster_id" in r["info"]
-            ),
-            None,
+    # Everything fetched is added to the deployment in one update at the end
+    extra = {}
+    try:
+        collect_deployment_details(
+            host, endpoint_cache, state, fetch_stats, deployment, extra
+        )
+    except Exception as e:
+        # executor.map would re-raise it in main and abort the whole run
+        log.error(
+            f"ERROR: Could not process deployment '{deployment.get('name')}' "
+            f"(ID: {deployment.get('id')}): {e}"
         )
+        extra["elasticsearch_cluster_health"] = {
+            "error": type(e).__name__,
+            "details": str(e),
+        }
+    deployment.update(extra)
+    return deployment
 
-    if (
-        es_resource
-        and es_resource["info"].get("cluster_id")
-        and es_resource["info"]["cluster_id"] != "cluster_id"
+
+def collect_deployment_details(
+    host, endpoint_cache, state, fetch_stats, deployment, extra
+):
+    """
+    Fetches the details, ES cluster health and stats of a single deployment.
+
+    Args:
+        host (str): The base URL of the environment.
+        endpoint_cache (dict): Cached responses keyed by deployment ID, then by URL.
+        state (dict): Health and stats of the previous run keyed by deployment ID,
+            updated in place with this run's.
+        fetch_stats (bool): Whether to also fetch the ES cluster stats.
+        deployment (dict): The deployment dictionary containing at least 'id' and 'name'.
+        extra (dict): Receives 'details', 'elasticsearch_cluster_health', and
+            'elasticsearch_cluster_stats' if available and requested, as each is
+            fetched.
+    """
+    dep_id = deployment["id"]
+    dep_name = deployment["name"]
+    log.info(f"\nProcessing Deployment: '{dep_name}' (ID: {dep_id})")
+    # Deployments are processed concurrently, so every later message names its own
+    label = f"'{dep_name}' (ID: {dep_id})"
+    # Unchanged responses are answered with a 304 and served from this cache
+    cache = endpoint_cache.setdefault(dep_id, {})
+
+    # The deployment list already carries the full details when the API
+    # returned resource info with it; otherwise fetch them to find the ES endpoint.
+    # The documented list response only has an array of resource references.
+    listed_resources = deployment.get("resources")
+    if isinstance(listed_resources, dict) and any(
+        "info" in r for r in listed_resources.get("elasticsearch", [])
     ):
-        es_endpoint = es_resource["info"]["metadata"].get("service_url")
+        details = dict(deployment)
+        # Moved under 'details' so the output does not hold them twice
+        deployment.pop("resources")
+        deployment.pop("metadata", None)
+    else:
+        details_url = host + DEPLOYMENT_URL_TMPL % dep_id
+        details = make_api_request(details_url, cache=cache, allow_stale=True)
+    extra["details"] = details
+
+    # Info of the Elasticsearch resource with a real cluster ID, if any
+    es_info = None
+    if isinstance(details, dict):
+        for r in details.get("resources", {}).get("elasticsearch", []):
+            try:
+                info = r["info"]
+                cluster_id = info["cluster_id"]
+            except KeyError:
+                continue
+            if cluster_id and cluster_id != "cluster_id":
+                es_info = info
+                break
+
+    if es_info:
+        try:
+            es_endpoint = es_info["metadata"]["service_url"]
+        except KeyError:
+            es_endpoint = None
         if es_endpoint:
-            print(f"  Found Elasticsearch endpoint: {es_endpoint}")
-
-            # Fetch ES Cluster Health
-            health_url = f"{es_endpoint}/_cluster/health"
-            deployment["elasticsearch_cluster_health"] = make_api_request(
-                health_url, username, password, verify_ssl
+            log.info(f"  {label}: Found Elasticsearch endpoint: {es_endpoint}")
+
+            # Reuse the previous snapshot if the deployment was not modified since
+            # and the snapshot has not expired
+            snapshot = state.get(dep_id, {})
+            last_modified = details.get("metadata", {}).get("last_modified")
+            unchanged = (
+                bool(last_modified)
+                and snapshot.get("last_modified") == last_modified
+                and time.time() - snapshot.get("saved_at", 0) < STATE_MAX_AGE_SECONDS
             )
+            if unchanged:
+                log.info(
+                    f"  {label}: Unchanged since the last run, reusing its cluster data."
+                )
+                extra["elasticsearch_cluster_health"] = snapshot[
+                    "elasticsearch_cluster_health"
+                ]
+            else:
+                # Fetch ES Cluster Health
+                health_url = es_endpoint + HEALTH_SUFFIX
+                extra["elasticsearch_cluster_health"] = make_api_request(
+                    health_url, cache=cache
+                )
 
-            # Fetch ES Cluster Stats
-            stats_url = f"{es_endpoint}/_cluster/stats"
-            deployment["elasticsearch_cluster_stats"] = make_api_request(
-                stats_url, username, password, verify_ssl
-            )
+            # Fetch ES Cluster Stats, the most expensive call, only when asked to.
+            # Nothing reads the stats, so they are kept as the raw response body.
+            if fetch_stats and unchanged and "elasticsearch_cluster_stats" in snapshot:
+                extra["elasticsearch_cluster_stats"] = snapshot[
+                    "elasticsearch_cluster_stats"
+                ]
+            elif fetch_stats:
+                stats_url = es_endpoint + STATS_SUFFIX
+                if STATS_FILTER_PATH:
+                    stats_url += "?filter_path=" + STATS_FILTER_PATH
+                extra["elasticsearch_cluster_stats"] = make_api_request(
+                    stats_url, cache=cache, raw=True
+                )
+
+            # Record the snapshot here, before the NDJSON writer drops the stats
+            saved_at = snapshot["saved_at"] if unchanged else time.time()
+            update_deployment_state(state, dep_id, last_modified, saved_at, extra)
         else:
-            print("  Elasticsearch service URL not found in metadata.")
+            log.info(f"  {label}: Elasticsearch service URL not found in metadata.")
     else:
-        print("  Elasticsearch resource endpoint not found or deployment is not ready.")
-    return deployment
+        log.info(
+            f"  {label}: Elasticsearch resource endpoint not found or deployment is "
+            "not ready."
+        )
 
 
 def print_summary(metrics_data):
@@ -176,36 +517,41 @@ def print_summary(metrics_data):
     Args:
         metrics_data (dict): The dictionary containing all collected metrics.
     """
-    print("\n" + "=" * 50)
-    print("                 METRICS SUMMARY")
-    print("=" * 50)
+    # Collect the summary and log it as one block: a single write instead of one
+    # per line, and no interleaving with other output
+    lines = []
+    lines.append("\n" + "=" * 50)
+    lines.append("                 METRICS SUMMARY")
+    lines.append("=" * 50)
 
     # Platform information
     platform_info = metrics_data.get("platform_info", {})
     if platform_info:
         version = platform_info.get("version", "Unknown")
-        print(f"\n--- Platform Info ---")
-        print(f"  Version: {version}")
+        lines.append(f"\n--- Platform Info ---")
+        lines.append(f"  Version: {version}")
+        if platform_info.get("stale"):
+            lines.append("  (cached: the last refresh failed)")
 
         # Check if regions information is available
         regions = platform_info.get("regions", [])
         if regions:
-            print(f"  Regions: {len(regions)}")
+            lines.append(f"  Regions: {len(regions)}")
             for region in regions:
                 region_id = region.get("region_id", "Unknown")
-                print(f"    - {region_id}")
+                lines.append(f"    - {region_id}")
 
                 # Show runner information if available
                 runners = region.get("runners", {})
                 if runners:
-                    print(
+                    lines.append(
                         f"      Runners: {runners.get('healthy_runners', 0)}/{runners.get('total_runners', 0)} healthy"
                     )
 
                 # Show proxy information if available
                 proxies = region.get("proxies", {})
                 if proxies:
-                    print(
+                    lines.append(
                         f"      Proxies: {proxies.get('proxies_count', 0)} ({proxies.get('healthy', False) and 'Healthy' or 'Unhealthy'})"
                     )
 
@@ -216,9 +562,9 @@ def print_summary(metrics_data):
         for zone in allocators_response["zones"]:
             zones.add(zone.get("zone_id", "Unknown"))
 
-    print(f"\n--- Zones ({len(zones)} found) ---")
+    lines.append(f"\n--- Zones ({len(zones)} found) ---")
     for zone in sorted(zones):
-        print(f"  - {zone}")
+        lines.append(f"  - {zone}")
 
     # Allocator summary
     all_allocators_flat = []
@@ -229,77 +575,61 @@ def print_summary(metrics_data):
                 all_allocators_flat.extend(zone["allocators"])
 
     if all_allocators_flat:
-        total_mem_gb = (
-            sum(
-                a["capacity"]["memory"]["total"]
-                for a in all_allocators_flat
-                if "capacity" in a
-                and "memory" in a["capacity"]
-                and "total" in a["capacity"]["memory"]
-            )
-            / 1024
-        )
-        used_mem_gb = (
-            sum(
-                a["capacity"]["memory"]["used"]
-                for a in all_allocators_flat
-                if "capacity" in a
-                and "memory" in a["capacity"]
-                and "used" in a["capacity"]["memory"]
-            )
-            / 1024
-        )
-        # Calculate total storage
-        total_storage_gb = (
-            sum(
-                a["capacity"]["storage"]["total"]
-                for a in all_allocators_flat
-                if "capacity" in a
-                and "storage" in a["capacity"]
-                and "total" in a["capacity"]["storage"]
-            )
-            / 1024
-        )
-        instance_count = sum(len(a.get("instances", [])) for a in all_allocators_flat)
-        print(f"\n--- Allocators ({len(all_allocators_flat)} found) ---")
-        print(f"  Total Memory Capacity: {total_mem_gb:.2f} GB")
-        print(
+        # Gather every allocator figure in a single pass
+        total_mem = used_mem = total_storage = 0
+        instance_count = healthy_allocators = 0
+        all_features = set()
+        memory_total_used = itemgetter("total", "used")
+        for allocator in all_allocators_flat:
+            capacity = allocator.get("capacity", {})
+            try:
+                mem_total, mem_used = memory_total_used(capacity["memory"])
+            except KeyError:
+                memory = capacity.get("memory", {})
+                mem_total, mem_used = memory.get("total", 0), memory.get("used", 0)
+            total_mem += mem_total
+            used_mem += mem_used
+            try:
+                total_storage += capacity["storage"]["total"]
+            except KeyError:
+                pass
+            instance_count += len(allocator.get("instances", []))
+            if allocator.get("status", {}).get("healthy", False):
+                healthy_allocators += 1
+            all_features.update(allocator.get("features", []))
+
+        total_mem_gb = total_mem / 1024
+        used_mem_gb = used_mem / 1024
+        total_storage_gb = total_storage / 1024
+        lines.append(f"\n--- Allocators ({len(all_allocators_flat)} found) ---")
+        if allocators_response.get("stale"):
+            lines.append("  (cached: the last refresh failed)")
+        lines.append(f"  Total Memory Capacity: {total_mem_gb:.2f} GB")
+        lines.append(
             f"  Used Memory Capacity:  {used_mem_gb:.2f} GB ({used_mem_gb/total_mem_gb:.1%} used)"
             if total_mem_gb > 0
             else "  Used Memory Capacity: N/A"
         )
-        print(f"  Total Storage: {total_storage_gb:.2f} GB")
-        print(f"  Total Instances: {instance_count}")
-
-        # Show allocator health status
-        healthy_allocators = sum(
-            1 for a in all_allocators_flat if a.get("status", {}).get("healthy", False)
+        lines.append(f"  Total Storage: {total_storage_gb:.2f} GB")
+        lines.append(f"  Total Instances: {instance_count}")
+        lines.append(
+            f"  Healthy Allocators: {healthy_allocators}/{len(all_allocators_flat)}"
         )
-        print(f"  Healthy Allocators: {healthy_allocators}/{len(all_allocators_flat)}")
-
-        # Show allocator health status
-        healthy_allocators = sum(
-            1 for a in all_allocators_flat if a.get("status", {}).get("healthy", False)
-        )
-        print(f"  Healthy Allocators: {healthy_allocators}/{len(all_allocators_flat)}")
-
-        # List features available across allocators
-        all_features = set()
-        for allocator in all_allocators_flat:
-            all_features.update(allocator.get("features", []))
-        print(f"  Available Features: {', '.join(sorted(all_features))}")
+        lines.append(f"  Available Features: {', '.join(sorted(all_features))}")
     else:
-        print("\n--- Allocators: Could not retrieve data or no allocators found. ---")
+        lines.append(
+            "\n--- Allocators: Could not retrieve data or no allocators found. ---"
+        )
         if isinstance(allocators_response, dict) and "error" in allocators_response:
-            print(
+            lines.append(
                 f"  Error details: {allocators_response.get('details', 'No details available')}"
             )
 
     # Deployment summary
     deployments = metrics_data.get("deployments_details", [])
-    print(f"\n--- Inspected Deployments ({len(deployments)} found) ---")
+    lines.append(f"\n--- Inspected Deployments ({len(deployments)} found) ---")
     if not deployments:
-        print("  No deployments found or collected.")
+        lines.append("  No deployments found or collected.")
     else:
         # Health status distribution
         health_status = {"green": 0, "yellow": 0, "red": 0, "error": 0, "unknown": 0}
@@ -309,114 +639,154 @@ def print_summary(metrics_data):
         total_nodes = 0
         elasticsearch_count = 0
         kibana_count = 0
+        # Name and status line of each deployment, in the order they were collected
+        deployment_rows = []
 
         for dep in deployments:
             health_info = dep.get("elasticsearch_cluster_health", {})
+            status_text = "Status: N/A"
 
             if "error" in health_info:
                 health_status["error"] += 1
+                status_text = f"Could not fetch health (Error: {health_info.get('details', 'unknown error')})"
             else:
-                status = health_info.get("status", "unknown").lower()
-                if status in health_status:
-                    health_status[status] += 1
+                status = health_info.get("status", "unknown")
+                if status.lower() in health_status:
+                    health_status[status.lower()] += 1
                 else:
                     health_status["unknown"] += 1
 
+                relocating = health_info.get("relocating_shards", 0)
+                status_text = f"Status: {status.upper()}"
+                if relocating > 0:
+                    status_text += f" | Relocating Shards: {relocating}"
+
+                # Add node count if available
+                node_count = health_info.get("number_of_nodes", 0)
+                if node_count > 0:
+                    status_text += f" | Nodes: {node_count}"
+
+                # Add index count if available
+                index_count = health_info.get("indices", 0)
+                if index_count > 0:
+                    status_text += f" | Indices: {index_count}"
+
             # Count resources by type
             resources = dep.get("details", {}).get("resources", {})
-            if resources:
-                elasticsearch_count += len(resources.get("elasticsearch", []))
-                kibana_count += len(resources.get("kibana", []))
+            es_resources = resources.get("elasticsearch", [])
+            elasticsearch_count += len(es_resources)
+            kibana_count += len(resources.get("kibana", []))
 
-            # Extract version info
-            details = dep.get("details", {})
-            for es in details.get("resources", {}).get("elasticsearch", []):
+            # Extract version info and topology memory and storage stats
+            dep_memory = 0
+            for es in es_resources:
                 es_info = es.get("info", {})
-                plan_info = (
-                    es_info.get("plan_info", {}).get("current", {}).get("plan", {})
-                )
-                version = plan_info.get("elasticsearch", {}).get("version", "unknown")
+                try:
+                    plan = es_info["plan_info"]["current"]["plan"]
+                    version = plan["elasticsearch"]["version"]
+                except KeyError:
+                    version = "unknown"
                 versions[version] = versions.get(version, 0) + 1
 
-            # Get topology info for memory and storage stats
-            for es in details.get("resources", {}).get("elasticsearch", []):
-                es_info = es.get("info", {})
-                for instance in es_info.get("topology", {}).get("instances", []):
-                    total_nodes += 1
-                    memory_total += instance.get("memory", {}).get(
-                        "instance_capacity", 0
-                    )
-                    storage = instance.get("disk", {})
-                    if storage:
-                        storage_total += storage.get("disk_space_available", 0)
+                try:
+                    instances = es_info["topology"]["instances"]
+                except KeyError:
+                    instances = ()
+                total_nodes += len(instances)
+                for instance in instances:
+                    try:
+                        dep_memory += instance["memory"]["instance_capacity"]
+                    except KeyError:
+                        pass
+                    try:
+                        storage_total += instance["disk"]["disk_space_available"]
+                    except KeyError:
+                        pass
+            memory_total += dep_memory
+
+            # Show nodes memory info when available
+            memory_info = ""
+            if dep_memory > 0:
+                memory_info = f" | Memory: {dep_memory/1024:.1f} GB"
+            stale_info = ""
+            if dep.get("details", {}).get("stale"):
+                stale_info = " | Details: cached, refresh failed"
+
+            deployment_rows.append(
+                (dep.get("name", dep["id"]), f"{status_text}{memory_info}{stale_info}")
+            )
 
         # Print summary stats
-        print(f"  Status Distribution: ", end="")
         status_str = []
         for status, count in health_status.items():
             if count > 0:
                 status_str.append(f"{status.upper()}: {count}")
-        print(", ".join(status_str))
+        lines.append(f"  Status Distribution: {', '.join(status_str)}")
 
         # Display versions found
-        print(f"  Elasticsearch Versions: ", end="")
         version_str = []
         for version, count in versions.items():
             version_str.append(f"{version} ({count})")
-        print(", ".join(version_str) if version_str else "None found")
+        lines.append(
+            f"  Elasticsearch Versions: {', '.join(version_str) if version_str else 'None found'}"
+        )
 
         # Display resource counts
-        print(
+        lines.append(
             f"  Resource Counts: {elasticsearch_count} Elasticsearch, {kibana_count} Kibana"
         )
 
         # Display memory and storage
-        print(f"  Total Memory Allocated: {memory_total/1024:.2f} GB")
-        print(f"  Total Storage Allocated: {storage_total/1024:.2f} GB")
-        print(f"  Total Nodes: {total_nodes}")
+        lines.append(f"  Total Memory Allocated: {memory_total/1024:.2f} GB")
+        lines.append(f"  Total Storage Allocated: {storage_total/1024:.2f} GB")
+        lines.append(f"  Total Nodes: {total_nodes}")
 
-        print("\n--- Deployment Details ---")
-        for dep in sorted(deployments, key=lambda x: x.get("name", x["id"])):
-            health_info = dep.get("elasticsearch_cluster_health", {})
-            status_text = "Status: N/A"
+        lines.append("\n--- Deployment Details ---")
+        for name, status_line in deployment_rows:
+            lines.append(f"  - {name}: {status_line}")
 
-            if "error" in health_info:
-                status_text = f"Could not fetch health (Error: {health_info.get('details', 'unknown error')})"
-            else:
-                status = health_info.get("status", "unknown")
-                relocating = health_info.get("relocating_shards", 0)
-                status_text = f"Status: {status.upper()}"
-                if relocating > 0:
-                    status_text += f" | Relocating Shards: {relocating}"
+    lines.append("\n" + "=" * 80 + "\n")
+    log.info("\n".join(lines))
 
-                # Add node count if available
-                node_count = health_info.get("number_of_nodes", 0)
-                if node_count > 0:
-                    status_text += f" | Nodes: {node_count}"
 
-                # Add index count if available
-                index_count = health_info.get("indices", 0)
-                if index_count > 0:
-                    status_text += f" | Indices: {index_count}"
+def zstd_compressor():
+    """
+    Creates the zstd compressor used for '.zst' output files.
 
-            # Show nodes memory info when available
-            memory_info = ""
-            details = dep.get("details", {})
-            total_memory = 0
-            for es in details.get("resources", {}).get("elasticsearch", []):
-                es_info = es.get("info", {})
-                for instance in es_info.get("topology", {}).get("instances", []):
-                    instance_memory = instance.get("memory", {}).get(
-                        "instance_capacity", 0
-                    )
-                    total_memory += instance_memory
+    Returns:
+        zstandard.ZstdCompressor: A level 3 compressor using all CPU cores.
+    """
+    return zstandard.ZstdCompressor(level=3, threads=-1)
+
+
+def open_output_file(path, compress=False):
+    """
+    Opens an output file for binary writing, optionally compressing it with zstd.
 
-            if total_memory > 0:
-                memory_info = f" | Memory: {total_memory/1024:.1f} GB"
+    Args:
+        path (str): The path to the file.
+        compress (bool): Whether to zstd-compress everything written (default: False).
 
-            print(f"  - {dep.get('name', dep['id'])}: {status_text}{memory_info}")
+    Returns:
+        file: A writable binary file object; closing it also closes the file.
+    """
+    f = open(path, "wb")
+    if compress:
+        return zstd_compressor().stream_writer(f)
+    return f
+
+
+def discard_file(path):
+    """
+    Removes a partially written file, ignoring one that does not exist.
 
-    print("\n" + "=" * 80 + "\n")
+    Args:
+        path (str): The path to the file.
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
 
 
 def save_metrics_to_file(data, output_file):
@@ -427,61 +797,302 @@ def save_metrics_to_file(data, output_file):
         data (dict): The dictionary containing all collected metrics.
         output_file (str): The path to the output JSON file.
     """
-    print(f"Attempting to write all collected data to '{output_file}'...")
+    log.info(f"Attempting to write all collected data to '{output_file}'...")
+    # Write next to the target and swap it in once complete, so a crash never
+    # leaves a truncated file behind
+    tmp_file = output_file + ".tmp"
     try:
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-        print(f"Successfully saved metrics to '{output_file}'")
+        # Serialize first so a serialization error leaves any previous file intact
+        payload = json_dumps(data, indent=True)
+        if output_file.endswith(".zst"):
+            payload = zstd_compressor().compress(payload)
+        # The payload is already UTF-8 bytes, so write it to a raw descriptor
+        # without going through Python's buffered file layers
+        fd = os.open(
+            tmp_file,
+            os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0),
+            0o644,
+        )
+        try:
+            view = memoryview(payload)
+            while view:
+                view = view[os.write(fd, view) :]
+        finally:
+            os.close(fd)
+        os.replace(tmp_file, output_file)
+        log.info(f"Successfully saved metrics to '{output_file}'")
     except IOError as e:
-        print(f"ERROR: Could not write to file '{output_file}': {e}", file=sys.stderr)
+        log.error(f"ERROR: Could not write to file '{output_file}': {e}")
+        discard_file(tmp_file)
     except TypeError as e:
-        print(
-            f"ERROR: Data serialization error when writing to '{output_file}': {e}",
-            file=sys.stderr,
+        log.error(
+            f"ERROR: Data serialization error when writing to '{output_file}': {e}"
         )
 
 
+def load_cache_file(cache_file):
+    """
+    Loads the endpoint cache or deployment state written by a previous run.
+
+    Args:
+        cache_file (str): The path to the cache file, or an empty string to disable caching.
+
+    Returns:
+        dict: The cached data keyed by deployment ID, or an empty dictionary.
+    """
+    if not cache_file:
+        return {}
+    try:
+        with open(cache_file, "rb") as f:
+            return json_loads(f.read())
+    except FileNotFoundError:
+        return {}
+    except (IOError, json.JSONDecodeError) as e:
+        log.warning(f"WARNING: Ignoring unreadable cache file '{cache_file}': {e}")
+        return {}
+
+
+def save_endpoint_cache(cache, cache_file):
+    """
+    Saves the cached responses for the next run.
+
+    Args:
+        cache (dict): The cached responses keyed by deployment ID, then by URL.
+        cache_file (str): The path to the cache file, or an empty string to disable caching.
+    """
+    if not cache_file:
+        return
+    try:
+        with open(cache_file, "wb") as f:
+            # Only URL entries are kept; this also drops files written by older
+            # versions, which held a single 'etag' and 'body' per deployment
+            cleaned = {
+                key: {
+                    url: entry
+                    for url, entry in urls.items()
+                    if isinstance(entry, dict) and "body" in entry
+                }
+                for key, urls in cache.items()
+            }
+            f.write(json_dumps({key: urls for key, urls in cleaned.items() if urls}))
+    except IOError as e:
+        log.warning(f"WARNING: Could not write cache file '{cache_file}': {e}")
+
+
+def update_deployment_state(state, dep_id, last_modified, saved_at, extra):
+    """
+    Records the cluster health and stats of a deployment for the next run.
+
+    Only a deployment with a known modification time and a successful health check
+    is kept, so anything that failed is queried again.
+
+    Args:
+        state (dict): Health and stats keyed by deployment ID, updated in place.
+        dep_id (str): The deployment ID.
+        last_modified (str): The deployment's 'metadata.last_modified' value.
+        saved_at (float): When the health was fetched, as a Unix timestamp.
+        extra (dict): The fetched 'elasticsearch_cluster_health' and, optionally,
+            'elasticsearch_cluster_stats'.
+    """
+    health = extra.get("elasticsearch_cluster_health")
+    if not last_modified or not health or "error" in health:
+        state.pop(dep_id, None)
+        return
+    entry = {
+        "last_modified": last_modified,
+        "saved_at": saved_at,
+        "elasticsearch_cluster_health": health,
+    }
+    stats = extra.get("elasticsearch_cluster_stats")
+    if stats is not None and not (isinstance(stats, dict) and "error" in stats):
+        entry["elasticsearch_cluster_stats"] = stats
+    state[dep_id] = entry
+
+
+def save_deployment_state(state, state_file):
+    """
+    Saves the cluster health and stats of each deployment for the next run.
+
+    Args:
+        state (dict): Health and stats keyed by deployment ID.
+        state_file (str): The path to the state file, or an empty string to disable it.
+    """
+    if not state_file:
+        return
+    try:
+        with open(state_file, "wb") as f:
+            f.write(json_dumps(state))
+    except IOError as e:
+        log.warning(f"WARNING: Could not write state file '{state_file}': {e}")
+
+
+def stream_metrics_to_file(metrics, deployments, output_file):
+    """
+    Streams the collected metrics to an NDJSON file, one deployment per line.
+
+    Every line is an object whose '_type' field names its content: a 'platform'
+    line and an 'allocators' line come first, followed by one 'deployment' line
+    per deployment. Each deployment is written as soon as it has been fetched,
+    after which its cluster stats are dropped from memory since the summary does
+    not use them.
+
+    Args:
+        metrics (dict): The platform and allocator metrics.
+        deployments (iterable): The deployment dictionaries, in the order they are fetched.
+        output_file (str): The path to the output NDJSON file.
+
+    Returns:
+        list: The deployment dictionaries, without their cluster stats.
+    """
+    log.info(f"Streaming collected data to '{output_file}'...")
+    deployments = iter(deployments)
+    collected = []
+    # Stream into a temporary file and only replace the previous output once
+    # every line has been written
+    tmp_file = output_file + ".tmp"
+    try:
+        with open_output_file(tmp_file, output_file.endswith(".zst")) as f:
+            platform = {"_type": "platform", **metrics["platform_info"]}
+            f.write(json_dumps(platform) + b"\n")
+            allocators = {"_type": "allocators", **metrics["allocators"]}
+            f.write(json_dumps(allocators) + b"\n")
+            for dep in deployments:
+                collected.append(dep)
+                f.write(json_dumps({"_type": "deployment", **dep}) + b"\n")
+                dep.pop("elasticsearch_cluster_stats", None)
+        os.replace(tmp_file, output_file)
+        log.info(f"Successfully saved metrics to '{output_file}'")
+    except IOError as e:
+        log.error(f"ERROR: Could not write to file '{output_file}': {e}")
+        discard_file(tmp_file)
+    except TypeError as e:
+        log.error(
+            f"ERROR: Data serialization error when writing to '{output_file}': {e}"
+        )
+        discard_file(tmp_file)
+    except BaseException:
+        # Anything else (e.g. Ctrl+C) still aborts the run, without a stray temp file
+        discard_file(tmp_file)
+        raise
+    # Still collect whatever was not written so the summary stays complete
+    collected.extend(deployments)
+    return collected
+
+
+def configure_logging(level):
+    """
+    Sends progress and summary output to stdout, and warnings and errors to stderr.
+    The handlers are installed once, so calling this again only changes the level.
+
+    Args:
+        level (str): The minimum level to log, e.g. 'INFO' or 'WARNING'.
+    """
+    if not log.handlers:
+        formatter = logging.Formatter("%(message)s")
+
+        stdout_handler = logging.StreamHandler(sys.stdout)
+        stdout_handler.setFormatter(formatter)
+        stdout_handler.addFilter(lambda record: record.levelno < logging.WARNING)
+
+        stderr_handler = logging.StreamHandler(sys.stderr)
+        stderr_handler.setFormatter(formatter)
+        stderr_handler.setLevel(logging.WARNING)
+
+        log.handlers = [stdout_handler, stderr_handler]
+        log.propagate = False
+    log.setLevel(level)
+
+
 def main():
     """
     Main function to load configuration, fetch metrics, print summary, and save to file.
     """
+    # An unknown level cannot configure logging, so report it at the default one
+    log_levels = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+    configure_logging(LOG_LEVEL if LOG_LEVEL in log_levels else "INFO")
+
     # Validate essential environment variables
-    if not all([HOST, USERNAME, PASSWORD]):
-        print(
-            "ERROR: Please ensure HOST, USERNAME, and PASSWORD are set in your .env file.",
-            file=sys.stderr,
+    if LOG_LEVEL not in log_levels:
+        log.error(f"ERROR: LOG_LEVEL must be one of {', '.join(log_levels)}.")
+        sys.exit(1)
+    if not HOST or not (API_KEY or (USERNAME and PASSWORD)):
+        log.error(
+            "ERROR: Please ensure HOST and either API_KEY or USERNAME and PASSWORD are set in your .env file."
         )
         sys.exit(1)
+    if OUTPUT_FILE.endswith(".zst") and zstandard is None:
+        log.error("ERROR: Writing a '.zst' OUTPUT_FILE requires the zstandard package.")
+        sys.exit(1)
+    if OUTPUT_FORMAT not in ("json", "ndjson"):
+        log.error("ERROR: OUTPUT_FORMAT must be either 'json' or 'ndjson'.")
+        sys.exit(1)
 
-    print(f"--- Starting Metrics Collection for Host: {HOST} ---")
+    log.info(f"--- Starting Metrics Collection for Host: {HOST} ---")
+    # Every request goes through the shared session, so configure it once.
+    # An API key takes precedence over basic authentication.
+    SESSION.auth = ApiKeyAuth(API_KEY) if API_KEY else (USERNAME, PASSWORD)
+    SESSION.verify = VERIFY_SSL
     all_metrics = {}
+    endpoint_cache = {} if NO_CACHE else load_cache_file(ENDPOINT_CACHE_FILE)
+    state = {} if NO_CACHE else load_cache_file(STATE_FILE)
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        # The deployment list does not depend on the platform and allocator
+        # data, so request all three at once.
+        deployment_list_future = executor.submit(fetch_deployment_list, HOST)
+
+        # Fetch Platform and Allocator
+        platform_allocator_metrics = fetch_platform_and_allocators(HOST, executor)
+        all_metrics.update(platform_allocator_metrics)
+
+        # Fetch Deployments
+        all_deployments = deployment_list_future.result()
+        detailed_deployments = []
+
+        # Fetch Detailed Metrics for each deployment
+        if all_deployments:
+            log.info("\n--- Fetching Detailed Metrics for Deployments ---")
+            # Deployments are independent, so fetch them concurrently; map()
+            # keeps the results in the original deployment order.
+            fetch_one = partial(
+                fetch_deployment_details,
+                HOST,
+                endpoint_cache,
+                state,
+                FETCH_STATS,
+            )
+            detailed_deployments = executor.map(fetch_one, all_deployments)
+        else:
+            log.info("No deployments found to fetch detailed metrics for.")
 
-    # Fetch Platform and Allocator
-    platform_allocator_metrics = fetch_platform_and_allocators(
-        HOST, USERNAME, PASSWORD, VERIFY_SSL
-    )
-    all_metrics.update(platform_allocator_metrics)
-
-    # Fetch Deployments
-    all_deployments = fetch_deployment_list(HOST, USERNAME, PASSWORD, VERIFY_SSL)
-    all_metrics["deployments_details"] = []  # Initialize as a list
+        if OUTPUT_FORMAT == "ndjson":
+            all_metrics["deployments_details"] = stream_metrics_to_file(
+                all_metrics, detailed_deployments, OUTPUT_FILE
+            )
+        else:
+            all_metrics["deployments_details"] = list(detailed_deployments)
 
-    # Fetch Detailed Metrics for each deployment
+    # Only keep cache entries for deployments that still exist
     if all_deployments:
-        print("\n--- Fetching Detailed Metrics for Deployments ---")
-        for dep in all_deployments:
-            detailed_dep = fetch_deployment_details(
-                HOST, USERNAME, PASSWORD, VERIFY_SSL, dep
-            )
-            all_metrics["deployments_details"].append(detailed_dep)
-    else:
-        print("No deployments found to fetch detailed metrics for.")
+        save_endpoint_cache(
+            {dep["id"]: endpoint_cache.get(dep["id"], {}) for dep in all_deployments},
+            ENDPOINT_CACHE_FILE,
+        )
+        save_deployment_state(
+            {
+                dep["id"]: state[dep["id"]]
+                for dep in all_deployments
+                if dep["id"] in state
+            },
+            STATE_FILE,
+        )
 
     # Print Summary
     print_summary(all_metrics)
 
     # Save to file
-    save_metrics_to_file(all_metrics, OUTPUT_FILE)
+    if OUTPUT_FORMAT == "json":
+        save_metrics_to_file(all_metrics, OUTPUT_FILE)
 
 
 if __name__ == "__main__":